@@ -4,3 +4,26 @@ Earthquakes package.
 This package provides tools to fetch earthquake data from INGV, store them in a
 local SQLite database and perform queries based on time range and magnitude.
 """
+
+__all__ = ["main"]
+
+
+def __getattr__(name):
+    """
+    Provide `eq_package.main` lazily.
+
+    The interface module is imported only when `main` is first accessed,
+    so importing `eq_package.db` or `eq_package.municipalities` does not
+    build the command-line parser, and `python -m eq_package.interface`
+    does not find the module already imported by the package.
+
+    Args:
+        name (str): Name of the missing attribute.
+
+    Returns:
+        callable: `eq_package.interface.main` when `name` is "main".
+    """
+    if name == "main":
+        from eq_package.interface import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,123 @@
+"""
+Compiled Haversine kernel for the Earthquakes project.
+
+This module provides a Numba-compiled version of the nearest municipalities
+search used by `eq_package.municipalities`.
+
+Numba is an optional dependency, imported only when the kernel is first
+requested with `get_topn()`. If it is not installed, `get_topn()` returns
+None and callers fall back to the NumPy implementation. The kernel is only
+used when the `EQ_USE_NUMBA` environment variable is set.
+"""
+
+import functools
+import math
+
+import numpy as np
+
+# Earth's radius in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+# LLVM fast-math flags for the compiled kernel. `fastmath=True` would also
+# enable "ninf" and "nnan", which make comparisons against the np.inf
+# sentinel of `_topn` undefined, so those two are left out
+_FASTMATH_FLAGS = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+
+def _topn(lat1, lon1, lats, lons, cos_lats, n):
+    """
+    Find the `n` points closest to (lat1, lon1) using the Haversine formula.
+
+    The points are scanned once: each distance is computed and, if it is
+    among the `n` smallest seen so far, inserted into a sorted buffer of
+    length `n`. For the small `n` used here this is cheaper (and more
+    branch-predictable) than storing and partitioning all distances.
+
+    Points are pruned before any trigonometry is evaluated: the great-circle
+    distance is never shorter than the distance along the meridian,
+    `EARTH_RADIUS_KM * abs(dlat)`, so a point whose latitude difference
+    alone exceeds the current n-th best distance cannot enter the buffer.
+
+    Args:
+        lat1 (float): Latitude of the reference point in radians.
+        lon1 (float): Longitude of the reference point in radians.
+        lats (np.ndarray): float64 array of latitudes in radians.
+        lons (np.ndarray): float64 array of longitudes in radians.
+        cos_lats (np.ndarray): float64 array with the cosine of `lats`,
+            precomputed by the caller.
+        n (int): Number of closest points to return.
+
+    Returns:
+        tuple: (idx, dist) where `idx` is an int64 array with the indices of
+        the closest points and `dist` the matching float64 distances in km,
+        both sorted by increasing distance.
+    """
+    count = lats.shape[0]
+    n = max(0, min(n, count))
+
+    best_idx = np.empty(n, dtype=np.int64)
+    best_dist = np.full(n, np.inf)
+    if n == 0:
+        return best_idx, best_dist
+
+    cos_lat1 = math.cos(lat1)
+    for i in range(count):
+        dlat = lats[i] - lat1
+
+        # Skip the point if it is too far in latitude alone
+        if EARTH_RADIUS_KM * abs(dlat) > best_dist[n - 1]:
+            continue
+
+        # Haversine distance to point i
+        dlon = lons[i] - lon1
+        a = (math.sin(dlat * 0.5)**2
+             + cos_lat1 * cos_lats[i] * math.sin(dlon * 0.5)**2
+             )
+        # Clip rounding errors near antipodal points, where a may exceed 1
+        d = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+        # Keep the n smallest distances in the sorted buffer
+        if d < best_dist[n - 1]:
+            j = n - 1
+            while j > 0 and best_dist[j - 1] > d:
+                best_dist[j] = best_dist[j - 1]
+                best_idx[j] = best_idx[j - 1]
+                j -= 1
+            best_dist[j] = d
+            best_idx[j] = i
+
+    return best_idx, best_dist
+
+
+@functools.lru_cache(maxsize=1)
+def get_topn():
+    """
+    Return the Numba-compiled version of `_topn`.
+
+    Numba is imported on the first call only. The kernel is compiled
+    eagerly for explicit signatures (read-only and writable float64 arrays),
+    so the first call does not pay for type inference, and the compiled
+    code is cached on disk so that later runs skip compilation. Fast-math
+    optimizations are enabled except those assuming no infinities or NaNs
+    (see `_FASTMATH_FLAGS`).
+
+    Returns:
+        callable or None: The compiled kernel, or None if Numba is not
+        installed.
+    """
+    try:
+        from numba import njit, types
+    except ImportError:
+        return None
+
+    result = types.Tuple((types.Array(types.int64, 1, "C"),
+                          types.Array(types.float64, 1, "C")))
+    signatures = [
+        result(types.float64, types.float64,
+               types.Array(types.float64, 1, "C", readonly=readonly),
+               types.Array(types.float64, 1, "C", readonly=readonly),
+               types.Array(types.float64, 1, "C", readonly=readonly),
+               types.int64)
+        for readonly in (True, False)
+    ]
+    return njit(signatures, fastmath=_FASTMATH_FLAGS, cache=True)(_topn)
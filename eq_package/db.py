@@ -12,6 +12,7 @@ Database location:
 
 Table schema:
     earthquakes_db(
+        id INTEGER PRIMARY KEY,
         day TEXT,
         time TEXT,
         mag REAL,
@@ -21,75 +22,304 @@ Table schema:
     )
 
 Notes:
-    - Earthquake data are retrieved via `gather_earthquakes(days)`.
-    - Duplicates prevention using a UNIQUE constraint and `INSERT OR IGNORE`.
+    - Earthquake data are retrieved via `iter_earthquakes_geojson(days)`
+      and parsed with `_parse_geojson` while being inserted.
+    - `query_db` is served by the `idx_mag_day` index on (mag DESC, day).
+    - Duplicates prevention using `INSERT OR IGNORE` on the primary key `id`,
+      a deterministic 64-bit hash of the other six columns.
+    - A single connection is opened (and the schema checked) once per
+      process by `_get_conn()` and shared by all functions of this module.
 """
 
+import atexit
+import hashlib
+import itertools
 import sqlite3
 import pathlib
-from eq_package.ingv_client import gather_earthquakes
+import sys
+import threading
+from collections.abc import Iterator
+from eq_package.ingv_client import _parse_geojson, iter_earthquakes_geojson
 from datetime import datetime, timedelta
 
+# Data directory holding earthquakes.db (resolved once, at import)
+_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent / "data"
+
+
+# SQL statement to create the table if it does not already exist
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS earthquakes_db (
+    id INTEGER PRIMARY KEY,
+    day TEXT,
+    time TEXT,
+    mag REAL,
+    latitude REAL,
+    longitude REAL,
+    place TEXT
+);
+"""
+
+# Index serving `query_db`: the planner walks it in magnitude order and
+# stops as soon as LIMIT rows matched, instead of scanning and sorting
+CREATE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_mag_day ON earthquakes_db (mag DESC, day);
+"""
+
+# SQL statement to insert data into the table
+INSERT_SQL = """
+INSERT OR IGNORE INTO earthquakes_db
+(id, day, time, mag, latitude, longitude, place)
+VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
 
-def create_earthquake_db(days) -> None:
+# Bulk loads first collect the rows in a TEMP table without constraints or
+# indexes, then merge them into `earthquakes_db` with a single statement
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE earthquakes_staging (
+    day TEXT,
+    time TEXT,
+    mag REAL,
+    latitude REAL,
+    longitude REAL,
+    place TEXT
+);
+"""
+
+STAGE_SQL = """
+INSERT INTO earthquakes_staging
+(day, time, mag, latitude, longitude, place)
+VALUES (?, ?, ?, ?, ?, ?);
+"""
+
+# Duplicates are dropped before hashing, and rows are inserted in key order
+# so that the primary key B-tree is filled sequentially
+MERGE_STAGING_SQL = """
+INSERT OR IGNORE INTO earthquakes_db
+(id, day, time, mag, latitude, longitude, place)
+SELECT event_id(day, time, mag, latitude, longitude, place) AS id,
+       day, time, mag, latitude, longitude, place
+FROM (SELECT DISTINCT day, time, mag, latitude, longitude, place
+      FROM earthquakes_staging)
+ORDER BY id;
+"""
+
+DROP_STAGING_SQL = """
+DROP TABLE earthquakes_staging;
+"""
+
+# SQL statement selecting the strongest recent earthquakes
+QUERY_SQL = """
+SELECT day, time, mag, latitude, longitude, place
+FROM earthquakes_db
+WHERE mag >= ?
+AND day >= ?
+ORDER BY mag DESC
+LIMIT ?;
+"""
+
+# Shared connection, created on first use by `_get_conn()`. The lock guards
+# both its creation and every use, since one connection is shared by all
+# threads. It is re-entrant so that callers holding it can call _get_conn().
+_CONN = None
+_CONN_LOCK = threading.RLock()
+
+# Python types of the six record columns (day, time, mag, latitude,
+# longitude, place), used to normalize the fields hashed by `_event_id`
+_COLUMN_TYPES = (str, str, float, float, float, str)
+
+
+def _event_id(earthquake) -> int:
     """
-    Create (if needed) and populate the SQLite database with earthquake data.
+    Compute the primary key of an earthquake record.
 
-    Workflow:
-        1) Fetch earthquakes from INGV for the last `days` days using
-           `gather_earthquakes(days)`.
-        2) Create the `earthquakes_db` table if it does not already exist.
-        3) Insert earthquake records into the table (duplicates are ignored).
-        4) Close the database connection.
+    The key is a 64-bit BLAKE2b hash of the six record fields, masked to a
+    non-negative value so it fits into an SQLite INTEGER. Unlike the built-in
+    `hash()`, it is stable across processes, so the same earthquake always
+    maps to the same `id`.
+
+    The fields are normalized to the types of their columns before hashing
+    (TEXT for day, time and place, REAL for the others), so a magnitude of
+    `3` read from the JSON and `3.0` read back from the table give the same
+    key. NULL fields are kept as None.
 
     Args:
-        days (int): Days in the past for which to fetch earthquake data.
+        earthquake (tuple): Record in the format
+            (day, time, mag, latitude, longitude, place)
 
     Returns:
-        None
+        int: Non-negative 63-bit integer key.
     """
-    # Retrieve earthquake data as a list of tuples:
-    # (day, time, mag, latitude, longitude, place)
-    earthquakes = gather_earthquakes(days)
+    key = "|".join(
+        repr(None if field is None else cast(field))
+        for cast, field in zip(_COLUMN_TYPES, earthquake)
+    ).encode("utf-8")
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
 
-    # Resolve path to data directory
-    base_dir = pathlib.Path(__file__).resolve().parent.parent
-    db_path = base_dir / "data" / "earthquakes.db"
 
-    # Open a connection to the SQLite database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def _with_ids(earthquakes):
+    """
+    Prepend the primary key to each earthquake record.
 
-    # SQL statement to create the table if it does not already exist
-    create_table_sql = """
-    CREATE TABLE IF NOT EXISTS earthquakes_db (
-        day TEXT,
-        time TEXT,
-        mag REAL,
-        latitude REAL,
-        longitude REAL,
-        place TEXT,
-        UNIQUE(day, time, mag, latitude, longitude, place)
-    );
+    Args:
+        earthquakes (iterable[tuple]): Records in the format
+            (day, time, mag, latitude, longitude, place)
+
+    Yields:
+        tuple: (id, day, time, mag, latitude, longitude, place)
+    """
+    for earthquake in earthquakes:
+        yield (_event_id(earthquake),) + tuple(earthquake)
+
+
+def _migrate_legacy_table(conn) -> None:
+    """
+    Convert a table created with the old schema to the current one.
+
+    Databases created by earlier versions have no `id` column and rely on a
+    six-column UNIQUE constraint. Their rows are copied into a table with
+    the current schema (computing `id` for each row) and the old table is
+    dropped.
+
+    Args:
+        conn (sqlite3.Connection): Connection in autocommit mode.
+
+    Returns:
+        None
+    """
+    columns = [row[1] for row in
+               conn.execute("PRAGMA table_info(earthquakes_db)")]
+    if "id" in columns:
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "ALTER TABLE earthquakes_db RENAME TO earthquakes_db_legacy"
+        )
+        conn.execute(CREATE_TABLE_SQL)
+        legacy_rows = conn.execute(
+            "SELECT day, time, mag, latitude, longitude, place "
+            "FROM earthquakes_db_legacy"
+        ).fetchall()
+        conn.executemany(INSERT_SQL, _with_ids(legacy_rows))
+        conn.execute("DROP TABLE earthquakes_db_legacy")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _get_conn():
     """
+    Return the shared connection to `data/earthquakes.db`.
 
-    # Execute the CREATE TABLE statement
-    cursor.execute(create_table_sql)
-    conn.commit()
+    On the first call, the connection is opened and configured, and the
+    table and index are created (upgrading old databases if needed). Later
+    calls return the same connection, so none of this is repeated and the
+    SQLite statement cache keeps the prepared statements across calls.
 
-    # SQL statement to insert data into the table
-    insert_sql = """
-    INSERT OR IGNORE INTO earthquakes_db
-    (day, time, mag, latitude, longitude, place)
-    VALUES (?, ?, ?, ?, ?, ?);
+    Returns:
+        sqlite3.Connection: Connection in autocommit mode
+        (`isolation_level=None`); callers manage transactions explicitly.
+    """
+    global _CONN
+    with _CONN_LOCK:
+        if _CONN is None:
+            db_path = _DATA_DIR / "earthquakes.db"
+
+            # isolation_level=None disables the implicit transactions of the
+            # sqlite3 module, so bulk inserts run in one explicit transaction
+            conn = sqlite3.connect(
+                db_path, isolation_level=None, check_same_thread=False
+            )
+
+            # Tune SQLite for bulk inserts: with WAL journaling, NORMAL
+            # synchronous mode is still safe against corruption and avoids
+            # an fsync per commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-64000")  # ~64 MB page cache
+
+            # Create the table if needed, upgrading old databases
+            conn.execute(CREATE_TABLE_SQL)
+            _migrate_legacy_table(conn)
+            conn.execute(CREATE_INDEX_SQL)
+
+            # Primary key function used by MERGE_STAGING_SQL
+            conn.create_function(
+                "event_id", 6, lambda *row: _event_id(row),
+                deterministic=True
+            )
+
+            atexit.register(conn.close)
+            _CONN = conn
+        return _CONN
+
+
+def create_earthquake_db(days, bulk=False) -> None:
     """
-    # Insert all earthquake records into the database
-    cursor.executemany(insert_sql, earthquakes)
-    conn.commit()
+    Create (if needed) and populate the SQLite database with earthquake data.
+
+    Workflow:
+        1) Create the `earthquakes_db` table if it does not already exist
+           (once per process, see `_get_conn()`).
+        2) Fetch earthquakes from INGV for the last `days` days (split into
+           concurrently requested time windows) and insert them into the
+           table (duplicates are ignored). The records of each response
+           are parsed and streamed into the table.
 
-    # Close cursor and connection
-    cursor.close()
-    conn.close()
+    All the responses are fetched before the write transaction starts, so
+    the database is locked only while the rows are inserted. If fetching
+    fails, the database is left untouched.
+
+    With `bulk=True` (meant for large one-shot loads such as the initial
+    seed), the records are first inserted into a TEMP staging table with no
+    constraints, then merged into `earthquakes_db` with a single
+    `INSERT OR IGNORE ... SELECT DISTINCT`, and the staging table is dropped.
+
+    The shared connection stays open for later calls.
+
+    Args:
+        days (int): Days in the past for which to fetch earthquake data.
+        bulk (bool): Load through a staging table (default: False).
+
+    Returns:
+        None
+    """
+    # Fetch all the INGV responses first (the time windows are requested
+    # concurrently), so that no write lock is held during network I/O. The
+    # bodies are kept undecoded; records are parsed lazily while inserting
+    bodies = list(iter_earthquakes_geojson(days))
+
+    # Insert the earthquake records:
+    # (id, day, time, mag, latitude, longitude, place)
+    # All rows are inserted in a single transaction; if inserting fails,
+    # nothing is written.
+    with _CONN_LOCK:
+        conn = _get_conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if bulk:
+                conn.execute(CREATE_STAGING_SQL)
+
+            # Stream the records into the database as they are parsed
+            earthquakes = itertools.chain.from_iterable(
+                map(_parse_geojson, bodies)
+            )
+            if bulk:
+                conn.executemany(STAGE_SQL, earthquakes)
+            else:
+                conn.executemany(INSERT_SQL, _with_ids(earthquakes))
+
+            if bulk:
+                conn.execute(MERGE_STAGING_SQL)
+                conn.execute(DROP_STAGING_SQL)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
 
 
 # Optional: Test the function
@@ -128,43 +358,42 @@ def query_db(k, days, min_magnitude) -> list[tuple]:
     # Calculate the minimum date to consider
     min_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
 
-    # Resolve path to data directory
-    base_dir = pathlib.Path(__file__).resolve().parent.parent
-    db_path = base_dir / "data" / "earthquakes.db"
+    # Query the db with parameters on the shared connection
+    with _CONN_LOCK:
+        return _get_conn().execute(
+            QUERY_SQL, (min_magnitude, min_date, k)
+        ).fetchall()
 
-    # Connect to the db
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    # Write the query
-    query_sql = """
-    SELECT day, time, mag, latitude, longitude, place
-    FROM earthquakes_db
-    WHERE mag >= ?
-    AND day >= ?
-    ORDER BY mag DESC
-    LIMIT ?;
+def format_earthquakes(earthquakes) -> Iterator[str]:
     """
+    Format earthquake records in the required style, one line at a time.
 
-    # Query the db with parameters
-    cursor.execute(query_sql, (min_magnitude, min_date, k))
-    results = cursor.fetchall()
+    Each record is formatted on one line using the format:
+        day: <day>, time: <time>,
+        magnitude: <mag>, lat: <lat>,
+        lon: <lon>, place: <place>
 
-    # Close connection
-    cursor.close()
-    conn.close()
+    Args:
+        earthquakes (iterable[tuple]): Earthquake tuples in the format:
+            (day, time, mag, lat, lon, place)
 
-    return results
+    Yields:
+        str: The formatted line of each record, including the trailing
+        newline.
+    """
+    for day, time, mag, lat, lon, place in earthquakes:
+        yield (
+            f"day: {day}, time: {time}, magnitude: {mag}, "
+            f"lat: {lat}, lon: {lon}, place: {place}\n"
+        )
 
 
 def print_earthquakes(earthquakes) -> None:
     """
     Print earthquake records in the required formatted style.
 
-    Each record is printed on one line using the format:
-        day: <day>, time: <time>,
-        magnitude: <mag>, lat: <lat>,
-        lon: <lon>, place: <place>
+    The lines are produced by `format_earthquakes(earthquakes)`.
 
     Args:
         earthquakes (list[tuple]): List of earthquake tuples in the format:
@@ -173,8 +402,5 @@ def print_earthquakes(earthquakes) -> None:
     Returns:
         None
     """
-    for day, time, mag, lat, lon, place in earthquakes:
-        print(
-            f"day: {day}, time: {time}, magnitude: {mag}, "
-            f"lat: {lat}, lon: {lon}, place: {place}"
-        )
+    # Join the lines and emit the whole output with a single write
+    sys.stdout.write("".join(format_earthquakes(earthquakes)))
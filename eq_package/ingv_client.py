@@ -18,41 +18,57 @@ This module does NOT handle:
 """
 
 import csv
+import functools
+import json
 import pathlib
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from eq_package.write_boundingbox import write_bounding_box
 
+# Data directory holding bounding_box.csv
+_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent / "data"
 
-def gather_earthquakes(days):
-    """
-    Fetch recent earthquake data from the INGV API within a
-    specified time range and geographic bounding box.
+# Use orjson to decode the INGV response when available: it parses the raw
+# bytes directly and is several times faster than the standard json module
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
-    This function ensures that the bounding box file exists by calling
-    `write_bounding_box()` if necessary, then reads the geographic coordinates
-    from `bounding_box.csv`, queries the INGV API for earthquake data,
-    and returns the results in a structured format.
+# INGV FDSN event web service endpoint; query parameters are passed
+# separately through `params`
+INGV_URL = "https://webservices.ingv.it/fdsnws/event/1/query"
 
-    Args:
-        days (int): Number of days in the past to fetch earthquake data for.
+# Long time ranges are split into windows of this many days, fetched
+# concurrently by at most MAX_WORKERS threads
+WINDOW_DAYS = 7
+MAX_WORKERS = 4
 
-    Returns:
-        list[tuple]: A list of earthquake records. Each tuple contains:
-            - day (str): Date of the earthquake (YYYY-MM-DD format)
-            - time (str): Time of the earthquake (HH:MM:SS format)
-            - magnitude (float): Magnitude of the earthquake
-            - latitude (float): Latitude of the earthquake epicenter
-            - longitude (float): Longitude of the earthquake epicenter
-            - place (str): Human-readable description of the location
+# Body used in place of an empty "204 No Content" response
+_EMPTY_GEOJSON = b'{"type": "FeatureCollection", "features": []}'
+
+# Shared HTTP session: reuses the TCP/TLS connection to INGV across calls
+_SESSION = requests.Session()
+
+
+@functools.lru_cache(maxsize=1)
+def _load_bounding_box():
     """
+    Read the geographic bounding box from `data/bounding_box.csv`.
+
+    The file is created with `write_bounding_box()` if it does not exist.
+    It is read only on the first call; the result is cached and reused by
+    every following call.
 
-    # Step 1: Read the bounding box parameters from CSV file
+    Returns:
+        dict: Mapping with the keys 'minlatitude', 'maxlatitude',
+        'minlongitude' and 'maxlongitude' to float values.
+    """
     bounding_box = {}
 
-    # Resolve path to data directory
-    base_dir = pathlib.Path(__file__).resolve().parent.parent
-    csv_path = base_dir / "data" / "bounding_box.csv"
+    csv_path = _DATA_DIR / "bounding_box.csv"
 
     # Create the CSV only if it does not exist yet
     if not csv_path.exists():
@@ -63,14 +79,59 @@ def gather_earthquakes(days):
         for row in reader:
             bounding_box[row[0]] = float(row[1])
 
-    # Step 2: Define the INGV API URL and query parameters
-    url = "https://webservices.ingv.it/fdsnws/event/1/query?"
-    start_time = (datetime.now() - timedelta(days=days)).isoformat()
-    end_time = datetime.now().isoformat()
+    return bounding_box
+
+
+def _time_windows(days, window_days=WINDOW_DAYS):
+    """
+    Split the last `days` days into consecutive time windows.
+
+    Args:
+        days (int): Number of days in the past to cover.
+        window_days (int): Maximum length of each window in days.
+
+    Returns:
+        list[tuple]: (start, end) datetime pairs covering the range from
+        `days` days ago up to now, oldest first.
+    """
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    step = timedelta(days=window_days)
+
+    windows = []
+    while start < now:
+        end = min(start + step, now)
+        windows.append((start, end))
+        start = end
+    return windows
+
+
+def fetch_earthquakes_geojson(start_time, end_time):
+    """
+    Fetch the raw GeoJSON response of the INGV API for a specified time
+    range and the geographic bounding box.
+
+    This function ensures that the bounding box file exists by calling
+    `write_bounding_box()` if necessary, then reads the geographic coordinates
+    from `bounding_box.csv` (once per process) and queries the INGV API for
+    earthquake data.
+
+    Args:
+        start_time (datetime): Start of the time range.
+        end_time (datetime): End of the time range.
+
+    Returns:
+        bytes: The undecoded GeoJSON body of the response.
+    """
+
+    # Step 1: Read the bounding box parameters (cached after the first call)
+    bounding_box = _load_bounding_box()
+
+    # Step 2: Define the INGV API query parameters
     params = {
         'format': 'geojson',
-        'starttime': start_time,
-        'endtime': end_time,
+        'starttime': start_time.isoformat(),
+        'endtime': end_time.isoformat(),
         'minlatitude': bounding_box['minlatitude'],
         'maxlatitude': bounding_box['maxlatitude'],
         'minlongitude': bounding_box['minlongitude'],
@@ -78,27 +139,115 @@ def gather_earthquakes(days):
     }
 
     # Step 3: Query the INGV API for earthquake data
-    response = requests.get(url, params=params)
+    response = _SESSION.get(INGV_URL, params=params)
 
     # Raise an HTTPError for bad responses (e.g., 404, 500)
     response.raise_for_status()
-    data = response.json()
 
-    # Step 4: Process the response and extract earthquake details
+    # INGV answers "204 No Content" when no earthquake matches
+    if response.status_code == 204:
+        return _EMPTY_GEOJSON
+    return response.content
+
+
+def iter_earthquakes_geojson(days):
+    """
+    Fetch the raw GeoJSON responses of the INGV API for the last `days` days.
+
+    The time range is split into windows of `WINDOW_DAYS` days, which are
+    requested concurrently (up to `MAX_WORKERS` at a time) through the
+    shared session. Each response is yielded as soon as it arrives, so the
+    caller can parse or store it while the other requests are in flight.
+
+    Args:
+        days (int): Number of days in the past to fetch earthquake data for.
+
+    Yields:
+        bytes: The undecoded GeoJSON body of each response, in completion
+        order. Events on a window boundary may appear in two responses.
+    """
+    windows = _time_windows(days)
+
+    # Load the bounding box before starting the worker threads, so that the
+    # CSV file is created (if needed) only once
+    _load_bounding_box()
+
+    if len(windows) <= 1:
+        for start_time, end_time in windows:
+            yield fetch_earthquakes_geojson(start_time, end_time)
+        return
+
+    workers = min(MAX_WORKERS, len(windows))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(fetch_earthquakes_geojson, start_time, end_time)
+            for start_time, end_time in windows
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def iter_earthquakes(days):
+    """
+    Fetch recent earthquake data from the INGV API within a
+    specified time range and geographic bounding box, yielding one
+    record at a time.
+
+    The responses are obtained with `iter_earthquakes_geojson(days)` and
+    their events are yielded in a structured format.
+
+    Since this is a generator, nothing is fetched until the first record
+    is requested, and each response is parsed only when its records are
+    consumed. Records are yielded in the order the responses arrive; an
+    event lying exactly on a window boundary may be yielded twice.
+
+    Args:
+        days (int): Number of days in the past to fetch earthquake data for.
+
+    Yields:
+        tuple: An earthquake record containing:
+            - day (str): Date of the earthquake (YYYY-MM-DD format)
+            - time (str): Time of the earthquake (HH:MM:SS format)
+            - magnitude (float): Magnitude of the earthquake
+            - latitude (float): Latitude of the earthquake epicenter
+            - longitude (float): Longitude of the earthquake epicenter
+            - place (str): Human-readable description of the location
+    """
+    for body in iter_earthquakes_geojson(days):
+        yield from _parse_geojson(body)
+
+
+def _parse_geojson(body):
+    """
+    Extract the earthquake records from an INGV GeoJSON response.
+
+    Args:
+        body (bytes): Undecoded GeoJSON body of an INGV response.
+
+    Yields:
+        tuple: (day, time, magnitude, latitude, longitude, place)
+    """
+    data = _json_loads(body)
+
+    # Process the response and extract earthquake details
     events = data['features']  # Access the 'features' key directly
-    earthquake_list = []
 
     for event in events:
         # Extract properties (metadata) and geometry (location) of the eq
         properties = event['properties']
         geometry = event['geometry']
 
-        # Convert the ISO 8601 time field into UTC date and time
-        timestamp = datetime.fromisoformat(
-            properties['time']  # Parse the ISO 8601 time
-        )
-        day = timestamp.strftime('%Y-%m-%d')  # Format as "YYYY-MM-DD"
-        time = timestamp.strftime('%H:%M:%S')  # Format as "HH:MM:SS"
+        # Split the ISO 8601 time field ("YYYY-MM-DDTHH:MM:SS...") into UTC
+        # date and time; the field widths are fixed, so slicing is enough
+        iso_time = properties['time']
+        if len(iso_time) >= 19:
+            day = iso_time[:10]  # "YYYY-MM-DD"
+            time = iso_time[11:19]  # "HH:MM:SS"
+        else:
+            # Unexpected (shortened) format: fall back to full parsing
+            timestamp = datetime.fromisoformat(iso_time)
+            day = timestamp.strftime('%Y-%m-%d')
+            time = timestamp.strftime('%H:%M:%S')
 
         # Extract other earthquake details
 
@@ -111,13 +260,25 @@ def gather_earthquakes(days):
         # Directly access 'place' key
         place = properties['place']
 
-        # Append the earthquake details as a tuple
-        earthquake_list.append(
-            (day, time, magnitude, latitude, longitude, place)
-        )
+        # Yield the earthquake details as a tuple
+        yield (day, time, magnitude, latitude, longitude, place)
 
-    # Step 5: Return the list of earthquake tuples
-    return earthquake_list
+
+def gather_earthquakes(days):
+    """
+    Fetch recent earthquake data from the INGV API as a list.
+
+    This is a convenience wrapper around `iter_earthquakes(days)` that
+    collects all records into a list.
+
+    Args:
+        days (int): Number of days in the past to fetch earthquake data for.
+
+    Returns:
+        list[tuple]: A list of earthquake records in the format:
+            (day, time, magnitude, latitude, longitude, place)
+    """
+    return list(iter_earthquakes(days))
 
 
 # Optional: Test the function
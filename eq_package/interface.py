@@ -19,30 +19,17 @@ Those responsibilities are delegated to the corresponding modules.
 """
 
 import argparse
-from eq_package.municipalities import get_closest_municipalities
-from eq_package.db import create_earthquake_db, query_db, print_earthquakes
+import itertools
+import sys
 
 
-def main():
+def _build_parser():
     """
-    Main entry point for the Earthquakes command-line application.
-
-    This function:
-    - Parses command-line arguments provided by the user
-    - Creates or updates the local SQLite database with recent earthquake data
-    - Queries the database for the strongest earthquakes matching the criteria
-    - Prints the results to standard output
-    - (Optional) print the closest italian municipalities for each earthquake
-
-    Expected command-line arguments:
-    --days (int, required): Days in the past to fetch earthquake data for
-    --K (int, required): Maximum number of strongest earthquakes to return
-    --magnitude (float, required): Minimum magnitude of earthquakes to consider
-    --closest-municipalities (flag, optional): If provided, show the 5 closest
-      italian municipalities for each earthquake
+    Build the command-line argument parser.
 
     Returns:
-        None
+        argparse.ArgumentParser: Parser for the `--days`, `--K`,
+        `--magnitude` and `--closest-municipalities` arguments.
     """
     # Create an argument parser object
     parser = argparse.ArgumentParser(
@@ -57,28 +44,81 @@ def main():
         "--days",
         type=int,
         required=True,
+        metavar="DAYS",
         help="Number of days in the past to fetch earthquake data for."
     )
     parser.add_argument(
         "--K",
         type=int,
         required=True,
+        metavar="K",
         help="The maximum number of strongest earthquakes to return."
     )
     parser.add_argument(
         "--magnitude",
         type=float,
         required=True,
+        metavar="MAGNITUDE",
         help="The minimum magnitude of earthquakes to consider."
     )
     parser.add_argument(
         "--closest-municipalities",
         action="store_true",
-        help="Show the 5 closest ilian municipalities for each earthquake."
+        help="Show the 5 closest italian municipalities for each earthquake."
     )
+    return parser
+
+
+# The parser is built once, when the module is imported
+_PARSER = _build_parser()
+
+
+def _format_group(line, closest):
+    """
+    Format an earthquake followed by its closest municipalities.
+
+    Args:
+        line (str): The formatted earthquake line, as produced by
+            `format_earthquakes`.
+        closest (list[tuple]): (municipality_name, distance_km) tuples.
+
+    Yields:
+        str: The earthquake line, then one indented line per municipality.
+    """
+    yield line
+    for municipality, distance in closest:
+        yield f"  - {municipality}: {distance:.2f} km\n"
 
+
+def main():
+    """
+    Main entry point for the Earthquakes command-line application.
+
+    This function:
+    - Parses command-line arguments provided by the user
+    - Creates or updates the local SQLite database with recent earthquake data
+    - Queries the database for the strongest earthquakes matching the criteria
+    - Prints the results to standard output
+    - (Optional) print the closest italian municipalities for each earthquake
+
+    Expected command-line arguments:
+    --days (int, required): Days in the past to fetch earthquake data for
+    --K (int, required): Maximum number of strongest earthquakes to return
+    --magnitude (float, required): Minimum magnitude of earthquakes to consider
+    --closest-municipalities (flag, optional): If provided, show the 5 closest
+      italian municipalities for each earthquake
+
+    Returns:
+        None
+    """
     # Parse the arguments
-    args = parser.parse_args()
+    args = _PARSER.parse_args()
+
+    # Import the working modules only after parsing, so that `--help` and
+    # argument errors do not pay for loading SQLite, requests and NumPy
+    from eq_package.db import (
+        create_earthquake_db, query_db, format_earthquakes, print_earthquakes
+    )
 
     # Create or update the earthquake database
     create_earthquake_db(args.days)
@@ -88,16 +128,26 @@ def main():
 
     # Print the results in the required format
     if args.closest_municipalities:
-        # Print with closest municipalities
-        for day, time, mag, lat, lon, place in earthquakes:
-            print(
-                f"day: {day}, time: {time}, magnitude: {mag}, "
-                f"lat: {lat}, lon: {lon}, place: {place}"
-            )
-            # Get and print the 5 closest municipalities
-            closest = get_closest_municipalities(lat, lon, n=5)
-            for municipality, distance in closest:
-                print(f"  - {municipality}: {distance:.2f} km")
+        # Get the 5 closest municipalities for all earthquakes at once
+        import numpy as np
+        from eq_package.municipalities import (
+            get_closest_municipalities_batch
+        )
+        lats = np.fromiter((eq[3] for eq in earthquakes), dtype=float,
+                           count=len(earthquakes))
+        lons = np.fromiter((eq[4] for eq in earthquakes), dtype=float,
+                           count=len(earthquakes))
+        all_closest = get_closest_municipalities_batch(lats, lons, n=5)
+
+        # Print with closest municipalities: the lines of every group are
+        # chained lazily and the whole output is emitted with a single write
+        lines = itertools.chain.from_iterable(
+            _format_group(line, closest)
+            for line, closest in zip(format_earthquakes(earthquakes),
+                                     all_closest)
+        )
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
     else:
         # Use original output format
         print_earthquakes(earthquakes)
@@ -9,7 +9,8 @@ Main responsibilities:
 
 Data source:
     The module expects a CSV file named `italian_municipalities.csv` stored
-    in the `data/` directory (sibling of the package directory).
+    in the `data/` directory (sibling of the package directory). Once
+    parsed, the data is cached in `data/italian_municipalities.npz`.
 
 Expected CSV columns:
     - name: municipality name (string)
@@ -20,11 +21,67 @@ Typical usage:
     closest = get_closest_municipalities(eq_lat, eq_lon, n=5)
     for name, km in closest:
         print(name, km)
+
+    For many epicenters at once, use
+    `get_closest_municipalities_batch(eq_lats, eq_lons, n=5)`.
 """
 
 import csv
-import math
+import functools
+import os
 import pathlib
+import zipfile
+
+import numpy as np
+
+from eq_package import _haversine
+
+# Data directory holding italian_municipalities.csv
+_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent / "data"
+
+# Binary cache of the parsed CSV, rebuilt whenever the CSV is newer. Set the
+# EQ_NO_CACHE environment variable to always parse the CSV instead
+_CACHE_PATH = _DATA_DIR / "italian_municipalities.npz"
+
+# Earth's radius in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+# Set the EQ_USE_NUMBA environment variable to search with the compiled
+# kernel of `_haversine` (if Numba is installed) instead of NumPy. It is off
+# by default: importing Numba and loading the kernel take far longer than a
+# NumPy search of the dataset
+_USE_NUMBA_ENV = "EQ_USE_NUMBA"
+
+# Datasets with at least this many municipalities are searched with a k-d
+# tree when SciPy is installed. Below it, importing SciPy and building the
+# tree cost more than the NumPy scan they replace
+KD_TREE_MIN_ROWS = 100_000
+
+
+def _haversine_km(lat1, lon1, lat2, lon2, cos_lat1, cos_lat2):
+    """
+    Evaluate the Haversine formula on coordinates already in radians.
+
+    All arguments may be scalars or NumPy arrays of compatible shapes;
+    the formula is applied elementwise. The cosines of the latitudes are
+    passed in so that callers can precompute them.
+
+    Args:
+        lat1, lon1: Coordinates of the first point(s) in radians.
+        lat2, lon2: Coordinates of the second point(s) in radians.
+        cos_lat1: Cosine of `lat1`.
+        cos_lat2: Cosine of `lat2`.
+
+    Returns:
+        float or np.ndarray: Distance(s) in kilometers.
+    """
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = (np.sin(dlat * 0.5)**2
+         + cos_lat1 * cos_lat2 * np.sin(dlon * 0.5)**2
+         )
+    # Clip rounding errors near antipodal points, where a may exceed 1
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
 
 
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -35,51 +92,219 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     The Haversine formula returns the great-circle distance between two points
     on a sphere from their longitudes and latitudes.
 
+    The arguments may also be NumPy arrays (or sequences) of coordinates, in
+    which case the distances are computed elementwise in a single vectorized
+    pass, e.g. from one epicenter to many municipalities at once.
+
     Args:
-        lat1 (float): Latitude of the first point in degrees.
-        lon1 (float): Longitude of the first point in degrees.
-        lat2 (float): Latitude of the second point in degrees.
-        lon2 (float): Longitude of the second point in degrees.
+        lat1 (float or array-like): Latitude of the first point in degrees.
+        lon1 (float or array-like): Longitude of the first point in degrees.
+        lat2 (float or array-like): Latitude of the second point in degrees.
+        lon2 (float or array-like): Longitude of the second point in degrees.
 
     Returns:
-        float: Distance in kilometers.
+        float or np.ndarray: Distance in kilometers (an array if any
+        argument is an array).
     """
-    # Earth's radius in kilometers
-    R = 6371.0
-
     # Convert coordinates from degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-
-    # Differences
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-
-    # Haversine formula
-    a = (math.sin(dlat / 2)**2
-         + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-         )
-
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    lat1_rad = np.radians(lat1)
+    lon1_rad = np.radians(lon1)
+    lat2_rad = np.radians(lat2)
+    lon2_rad = np.radians(lon2)
 
-    # Calculate distance
-    distance = R * c
+    distance = _haversine_km(
+        lat1_rad, lon1_rad, lat2_rad, lon2_rad,
+        np.cos(lat1_rad), np.cos(lat2_rad)
+    )
 
+    if np.ndim(distance) == 0:
+        return float(distance)
     return distance
 
 
+def _read_csv(csv_path):
+    """
+    Parse the municipalities CSV file.
+
+    The whole file is parsed in C with `numpy.loadtxt`, locating the
+    columns from the header row.
+
+    Args:
+        csv_path (pathlib.Path): Path of `italian_municipalities.csv`.
+
+    Returns:
+        tuple: (names, lat_rad, lon_rad) where `names` is a unicode array of
+        municipality names and `lat_rad`, `lon_rad` are float64 arrays of
+        coordinates in radians.
+    """
+    with open(csv_path, mode='r', encoding='utf-8') as file:
+        header = next(csv.reader(file))
+        data = np.loadtxt(
+            file,
+            delimiter=',',
+            dtype=[('name', 'U64'), ('latitude', 'f8'), ('longitude', 'f8')],
+            usecols=(header.index('name'), header.index('latitude'),
+                     header.index('longitude')),
+            ndmin=1,
+        )
+
+    return (data['name'], np.radians(data['latitude']),
+            np.radians(data['longitude']))
+
+
+def _read_cache(csv_path):
+    """
+    Read the parsed municipalities from the binary cache.
+
+    Args:
+        csv_path (pathlib.Path): Path of the CSV file the cache was built
+            from.
+
+    Returns:
+        tuple or None: (names, lat_rad, lon_rad) as returned by `_read_csv`,
+        or None if the cache is disabled, missing, older than the CSV or
+        unreadable.
+    """
+    if os.environ.get("EQ_NO_CACHE"):
+        return None
+    try:
+        if _CACHE_PATH.stat().st_mtime < csv_path.stat().st_mtime:
+            return None
+        with np.load(_CACHE_PATH) as cache:
+            return cache['names'], cache['lat_rad'], cache['lon_rad']
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+
+def _write_cache(names, lat_rad, lon_rad):
+    """
+    Save the parsed municipalities to the binary cache.
+
+    The file is written under a temporary name and then renamed, so that a
+    concurrent reader never sees a partial cache. Errors (e.g. a read-only
+    `data/` directory) are ignored: the cache is only an optimization.
+
+    Args:
+        names (np.ndarray): Unicode array of municipality names.
+        lat_rad (np.ndarray): Latitudes in radians.
+        lon_rad (np.ndarray): Longitudes in radians.
+    """
+    if os.environ.get("EQ_NO_CACHE"):
+        return
+    tmp_path = _CACHE_PATH.with_name(f"{_CACHE_PATH.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, mode='wb') as file:
+            np.savez(file, names=names, lat_rad=lat_rad, lon_rad=lon_rad)
+        os.replace(tmp_path, _CACHE_PATH)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_municipalities():
+    """
+    Load the municipalities dataset into NumPy arrays.
+
+    The dataset is read only on the first call; the result is cached and
+    reused by every following call. The CSV file is parsed once and saved
+    to `data/italian_municipalities.npz`; later runs load the arrays from
+    that binary file instead, as long as it is newer than the CSV.
+
+    Each column is stored as a separate contiguous array (structure of
+    arrays), and all arrays are read-only.
+
+    Returns:
+        tuple: (names, lat_rad, lon_rad, cos_lat, xyz) where `names` is an
+        object array of municipality names, `lat_rad` and `lon_rad` are
+        float64 arrays of coordinates in radians, `cos_lat` is the cosine of
+        `lat_rad` and `xyz` is an (N, 3) array of unit vectors pointing at
+        each municipality (used to rank municipalities by distance).
+    """
+    csv_path = _DATA_DIR / "italian_municipalities.csv"
+
+    parsed = _read_cache(csv_path)
+    if parsed is None:
+        parsed = _read_csv(csv_path)
+        _write_cache(*parsed)
+    names, lat_rad, lon_rad = parsed
+
+    cos_lat = np.cos(lat_rad)
+    xyz = _unit_vectors(lat_rad, lon_rad)
+    arrays = (names.astype(object), lat_rad, lon_rad, cos_lat, xyz)
+
+    # The arrays are shared by every caller through the cache: make them
+    # read-only so that no caller can modify them by accident
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
+
+
+@functools.lru_cache(maxsize=1)
+def _tree():
+    """
+    Build a k-d tree over the municipality unit vectors.
+
+    The straight-line (chord) distance between two unit vectors grows
+    monotonically with the great-circle distance between the two points,
+    so the nearest neighbours in the tree are exactly the closest
+    municipalities. SciPy is imported and the tree is built on the first
+    call only; the result is cached.
+
+    Returns:
+        scipy.spatial.cKDTree or None: The tree, or None if SciPy is not
+        installed.
+    """
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        return None
+    return cKDTree(_load_municipalities()[4], leafsize=40)
+
+
+@functools.lru_cache(maxsize=1)
+def _max_duplicates():
+    """
+    Return the largest number of municipalities sharing the same position.
+
+    The dataset contains a few municipalities listed twice, or under two
+    names, with identical coordinates: they are always at the same distance
+    from any epicenter.
+
+    Returns:
+        int: Size of the largest group of municipalities with identical
+        coordinates (1 if all positions are distinct).
+    """
+    xyz = _load_municipalities()[4]
+    if len(xyz) == 0:
+        return 1
+    _, counts = np.unique(xyz, axis=0, return_counts=True)
+    return int(counts.max())
+
+
+def _unit_vectors(lat_rad, lon_rad):
+    """
+    Convert points given in radians to unit vectors in 3D space.
+
+    Args:
+        lat_rad (float or np.ndarray): Latitude(s) in radians.
+        lon_rad (float or np.ndarray): Longitude(s) in radians.
+
+    Returns:
+        np.ndarray: Array of shape (..., 3) with the [x, y, z] components
+        of each unit vector.
+    """
+    cos_lat = np.cos(lat_rad)
+    return np.stack((cos_lat * np.cos(lon_rad),
+                     cos_lat * np.sin(lon_rad),
+                     np.sin(lat_rad)), axis=-1)
+
+
 def get_closest_municipalities(eq_lat, eq_lon, n=5):
     """
     Find the `n` closest Italian municipalities to an earthquake epicenter.
 
-    This function loads the municipalities dataset from:
-        data/italian_municipalities.csv
-
-    For each municipality, it computes the great-circle distance (in km)
-    from the earthquake epicenter (eq_lat, eq_lon)
-    and returns the closest `n` results.
+    This is a convenience wrapper around `get_closest_municipalities_batch`
+    for a single epicenter.
 
     Args:
         eq_lat (float): Latitude of the earthquake epicenter (decimal degrees)
@@ -90,24 +315,96 @@ def get_closest_municipalities(eq_lat, eq_lon, n=5):
         list[tuple]: List of tuples (municipality_name, distance_km), sorted by
         increasing distance, with length at most `n`.
     """
-    municipalities = []
+    return get_closest_municipalities_batch([eq_lat], [eq_lon], n)[0]
 
-    # Resolve path to data directory
-    base_dir = pathlib.Path(__file__).resolve().parent.parent
-    csv_path = base_dir / "data" / "italian_municipalities.csv"
 
-    # Load municipalities from CSV
-    with open(csv_path, mode='r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            name = row['name']
-            lat = float(row['latitude'])
-            lon = float(row['longitude'])
-
-            # Calculate distance from earthquake epicenter
-            distance = calculate_distance(eq_lat, eq_lon, lat, lon)
-            municipalities.append((name, distance))
-
-    # Sort by distance and return the n closest
-    municipalities.sort(key=lambda x: x[1])
-    return municipalities[:n]
+def get_closest_municipalities_batch(eq_lats, eq_lons, n=5):
+    """
+    Find the `n` closest Italian municipalities to each of many epicenters.
+
+    The municipalities dataset is loaded once from:
+        data/italian_municipalities.csv
+
+    All the epicenters are processed together. The municipalities are
+    ranked by the dot product of unit vectors (which orders points exactly
+    like the great-circle distance, without trigonometric functions), with
+    a single (K, N) matrix product for the K epicenters. The great-circle
+    distance (in km) is then computed with the Haversine formula for the
+    closest `n` only.
+
+    For datasets of at least `KD_TREE_MIN_ROWS` municipalities, if SciPy is
+    installed, the closest municipalities are instead looked up with a
+    single query to a k-d tree built once over the dataset. Otherwise, if
+    the `EQ_USE_NUMBA` environment variable is set and Numba is installed,
+    the compiled kernel in `_haversine` is run for each epicenter.
+
+    Args:
+        eq_lats (array-like): Latitudes of the K epicenters (decimal degrees)
+        eq_lons (array-like): Longitudes of the K epicenters (decimal degrees)
+        n (int): Number of closest municipalities to return (default: 5)
+
+    Returns:
+        list[list[tuple]]: For each epicenter, in input order, a list of
+        tuples (municipality_name, distance_km) sorted by increasing
+        distance (municipalities at the same distance in dataset order),
+        with length at most `n`.
+    """
+    names, lat_rad, lon_rad, cos_lat, xyz = _load_municipalities()
+
+    eq_lat_rad = np.radians(np.asarray(eq_lats, dtype=np.float64))
+    eq_lon_rad = np.radians(np.asarray(eq_lons, dtype=np.float64))
+    count = len(eq_lat_rad)
+    n = min(n, len(names))
+    if n <= 0 or count == 0:
+        return [[] for _ in range(count)]
+
+    points = _unit_vectors(eq_lat_rad, eq_lon_rad)
+
+    # Municipalities with identical coordinates tie in distance. Selecting
+    # a few extra candidates, then sorting by (distance, index) and keeping
+    # the first n, returns the same municipalities in the same order on
+    # every backend (the Numba kernel keeps the lowest index of a tie)
+    k = min(n + _max_duplicates() - 1, len(names))
+
+    tree = _tree() if len(names) >= KD_TREE_MIN_ROWS else None
+    topn = (_haversine.get_topn() if os.environ.get(_USE_NUMBA_ENV)
+            else None)
+    if tree is not None:
+        # One k-d tree query for all the epicenters
+        _, idx = tree.query(points, k=k)
+        idx = idx.reshape(count, k)
+    elif topn is not None:
+        # Run the compiled kernel once per epicenter
+        results = []
+        for lat, lon in zip(eq_lat_rad.tolist(), eq_lon_rad.tolist()):
+            idx, distances = topn(lat, lon, lat_rad, lon_rad, cos_lat, n)
+            results.append(
+                list(zip(names[idx].tolist(), distances.tolist()))
+            )
+        return results
+    else:
+        # Rank all municipalities without any trigonometry: the great-circle
+        # distance grows monotonically as the dot product between the unit
+        # vectors of the two points decreases, so the n largest dot products
+        # of each row are exactly the n closest municipalities
+        dot = points @ xyz.T
+        if k == len(names):
+            idx = np.broadcast_to(np.arange(k), (count, k))
+        else:
+            # O(N) partition per row; only the k selected entries get sorted
+            idx = np.argpartition(-dot, k - 1, axis=1)[:, :k]
+
+    # Haversine formula, evaluated only for the selected municipalities
+    distances = _haversine_km(
+        eq_lat_rad[:, None], eq_lon_rad[:, None], lat_rad[idx], lon_rad[idx],
+        np.cos(eq_lat_rad)[:, None], cos_lat[idx]
+    )
+
+    # Sort each row by distance, breaking ties by index, and keep n entries
+    order = np.lexsort((idx, distances), axis=1)[:, :n]
+    idx = np.take_along_axis(idx, order, axis=1)
+    distances = np.take_along_axis(distances, order, axis=1)
+
+    return [list(zip(row_names, row_distances))
+            for row_names, row_distances
+            in zip(names[idx].tolist(), distances.tolist())]
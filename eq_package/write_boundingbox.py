@@ -24,6 +24,9 @@ File format:
 import csv
 import pathlib
 
+# Data directory (sibling of the package directory), resolved once
+_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent / "data"
+
 
 def write_bounding_box():
     """
@@ -49,9 +52,7 @@ def write_bounding_box():
         'maxlongitude': 20.0
     }
 
-    # Resolve path to data directory
-    base_dir = pathlib.Path(__file__).resolve().parent.parent
-    csv_path = base_dir / "data" / "bounding_box.csv"
+    csv_path = _DATA_DIR / "bounding_box.csv"
 
     # Open csv_path in write mode
     # Use newline='' to prevent extra blank lines in the CSV file on Windows
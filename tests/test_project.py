@@ -11,18 +11,81 @@ The tests validate the core requirements described in the lab instructions:
 - ordering of query results (sorted by decreasing magnitude)
 - one additional sanity test (database not empty)
 
+Further test classes run offline, with a temporary database and a mocked
+INGV web service:
+- the same event is stored once whatever the ingestion path
+- the database is not locked while the INGV responses are fetched
+- the closest municipalities match a Haversine reference on every search
+  backend, including edge cases of `n` and of the batch size
+- the binary cache of the municipalities dataset and `EQ_NO_CACHE`
+
 How to run:
     python -m unittest tests/test_project.py
 """
 
 import unittest
-from unittest import TestCase
+from unittest import TestCase, mock
+import contextlib
 import csv
+import importlib.util
+import json
+import os
 import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+from eq_package import _haversine, db, ingv_client, municipalities
 from eq_package.db import create_earthquake_db, query_db
+from eq_package.municipalities import (
+    calculate_distance, get_closest_municipalities,
+    get_closest_municipalities_batch
+)
 from eq_package.write_boundingbox import write_bounding_box
 import pathlib
 
+# Bounding box used instead of data/bounding_box.csv by the offline tests
+OFFLINE_BOUNDING_BOX = {
+    'minlatitude': 35.0, 'maxlatitude': 47.5,
+    'minlongitude': 5.0, 'maxlongitude': 20.0,
+}
+
+
+def make_geojson(*events):
+    """
+    Build an INGV-like GeoJSON response body.
+
+    Args:
+        *events (tuple): (time, mag, latitude, longitude, place) tuples,
+            with `time` in ISO 8601 format.
+
+    Returns:
+        bytes: The encoded GeoJSON FeatureCollection.
+    """
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"time": time, "mag": mag, "place": place},
+            "geometry": {"type": "Point",
+                         "coordinates": [longitude, latitude, 10.0]},
+        }
+        for time, mag, latitude, longitude, place in events
+    ]
+    return json.dumps(
+        {"type": "FeatureCollection", "features": features}
+    ).encode("utf-8")
+
+
+class FakeResponse:
+    """Minimal stand-in for `requests.Response` with a 200 status."""
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
 
 class TestProject(TestCase):
     """
@@ -142,6 +205,375 @@ class TestProject(TestCase):
         )
 
 
+class TestDatabaseOffline(TestCase):
+    """
+    Offline tests of the database module.
+
+    Each test runs on a fresh database in a temporary directory; the INGV
+    web service is replaced by a mock returning `self.body`.
+    """
+    def setUp(self):
+        """Point the database module to a temporary data directory."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_path = pathlib.Path(tmp_dir.name) / "earthquakes.db"
+
+        # One event, one day ago, with integer-valued magnitude and
+        # longitude (the REAL columns store them as 3.0 and 13.0)
+        event_time = (datetime.now() - timedelta(days=1)).isoformat()
+        self.event = (event_time, 3, 45.5, 13, "A")
+        self.body = make_geojson(self.event)
+
+        patches = [
+            mock.patch.object(db, "_DATA_DIR", self.db_path.parent),
+            mock.patch.object(db, "_CONN", None),
+            mock.patch.object(ingv_client, "_load_bounding_box",
+                              return_value=OFFLINE_BOUNDING_BOX),
+            mock.patch.object(ingv_client._SESSION, "get",
+                              side_effect=lambda *args, **kwargs:
+                              FakeResponse(self.body)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        # Registered last, so it runs before the patches are undone
+        self.addCleanup(self.close_conn)
+
+    def close_conn(self):
+        """Close the connection opened by the test, if any."""
+        if db._CONN is not None:
+            db._CONN.close()
+
+    def count_rows(self):
+        """Return the number of rows in the temporary database."""
+        with db._CONN_LOCK:
+            return db._get_conn().execute(
+                "SELECT COUNT(*) FROM earthquakes_db"
+            ).fetchone()[0]
+
+    def test_event_id_normalizes_types(self):
+        """Test that raw JSON values and column values give the same key."""
+        day, time = self.event[0][:10], self.event[0][11:19]
+        self.assertEqual(
+            db._event_id((day, time, 3, 45.5, 13, "A")),
+            db._event_id((day, time, 3.0, 45.5, 13.0, "A")),
+        )
+
+    def test_direct_and_bulk_ingest(self):
+        """Test that direct and bulk loads of one event store one row."""
+        create_earthquake_db(3)
+        create_earthquake_db(3, bulk=True)
+
+        self.assertEqual(self.count_rows(), 1)
+        self.assertEqual(len(query_db(k=10, days=3, min_magnitude=1.0)), 1)
+
+    def test_no_lock_during_fetch(self):
+        """Test that another writer can use the database during a fetch."""
+        create_earthquake_db(3)
+
+        def fetch(*args, **kwargs):
+            # Fails with "database is locked" if the write lock is held
+            other = sqlite3.connect(self.db_path, timeout=0,
+                                    isolation_level=None)
+            try:
+                other.execute("BEGIN IMMEDIATE")
+                other.execute("ROLLBACK")
+            finally:
+                other.close()
+            return FakeResponse(self.body)
+
+        with mock.patch.object(ingv_client._SESSION, "get",
+                               side_effect=fetch):
+            create_earthquake_db(3)
+
+    def test_failed_fetch_writes_nothing(self):
+        """Test that a failing fetch leaves the database untouched."""
+        create_earthquake_db(3)
+
+        with mock.patch.object(ingv_client._SESSION, "get",
+                               side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                create_earthquake_db(3)
+        self.assertEqual(self.count_rows(), 1)
+
+    def test_legacy_migration(self):
+        """Test that a migrated legacy row matches a re-ingested event."""
+        # Database created with the schema of earlier versions
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE earthquakes_db (day TEXT, time TEXT, mag REAL, "
+            "latitude REAL, longitude REAL, place TEXT, "
+            "UNIQUE(day, time, mag, latitude, longitude, place))"
+        )
+        event_time, mag, latitude, longitude, place = self.event
+        conn.execute(
+            "INSERT INTO earthquakes_db VALUES (?, ?, ?, ?, ?, ?)",
+            (event_time[:10], event_time[11:19], mag, latitude, longitude,
+             place)
+        )
+        conn.commit()
+        conn.close()
+
+        create_earthquake_db(3)
+
+        with db._CONN_LOCK:
+            columns = [row[1] for row in db._get_conn().execute(
+                "PRAGMA table_info(earthquakes_db)")]
+        self.assertIn("id", columns)
+        self.assertEqual(self.count_rows(), 1)
+
+
+class TestClosestMunicipalities(TestCase):
+    """
+    Offline tests of the closest municipalities search.
+
+    NumPy is the default backend; the k-d tree backend is selected by
+    lowering `KD_TREE_MIN_ROWS` and the Numba one with `EQ_USE_NUMBA`.
+    """
+    # Epicenters spread over the bounding box, including points next to
+    # municipalities listed twice with identical coordinates
+    EPICENTERS = [(lat, lon)
+                  for lat in (36.0, 38.1, 40.3, 43.8, 44.66, 45.4, 47.0)
+                  for lon in (7.5, 8.9, 10.9, 11.6, 12.6, 15.1, 16.4, 18.4)]
+
+    @classmethod
+    def setUpClass(cls):
+        """Keep the dataset and Numba caches out of the source tree."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp_dir.cleanup)
+
+        # Numba reads NUMBA_CACHE_DIR when it is first imported, which
+        # happens lazily in `_haversine.get_topn()`
+        patch = mock.patch.dict(os.environ, {
+            "EQ_NO_CACHE": "1",
+            "NUMBA_CACHE_DIR": tmp_dir.name,
+        })
+        patch.start()
+        cls.addClassCleanup(patch.stop)
+        os.environ.pop("EQ_USE_NUMBA", None)
+
+    def backends(self):
+        """Return the names of the backends available in this environment."""
+        backends = ["numpy"]
+        if _haversine.get_topn() is not None:
+            backends.append("numba")
+        if importlib.util.find_spec("scipy") is not None:
+            backends.append("tree")
+        return backends
+
+    def closest(self, backend, n, epicenters=None):
+        """
+        Run `get_closest_municipalities_batch` on the given backend.
+
+        Args:
+            backend (str): 'tree', 'numba' or 'numpy'.
+            n (int): Number of closest municipalities per epicenter.
+            epicenters (list[tuple]): (lat, lon) pairs, by default
+                `EPICENTERS`.
+
+        Returns:
+            list[list[tuple]]: The result of the batch search.
+        """
+        if epicenters is None:
+            epicenters = self.EPICENTERS
+        with contextlib.ExitStack() as stack:
+            if backend == "tree":
+                stack.enter_context(mock.patch.object(
+                    municipalities, "KD_TREE_MIN_ROWS", 0))
+            if backend == "numba":
+                stack.enter_context(mock.patch.dict(
+                    os.environ, {"EQ_USE_NUMBA": "1"}))
+            return municipalities.get_closest_municipalities_batch(
+                [lat for lat, _ in epicenters],
+                [lon for _, lon in epicenters],
+                n=n
+            )
+
+    @staticmethod
+    def reference(lat, lon, n):
+        """
+        Compute the closest municipalities by brute force.
+
+        The CSV file is read with the `csv` module and the distance to
+        every municipality is computed with `calculate_distance`; ties are
+        kept in file order by the stable sort.
+
+        Args:
+            lat (float): Latitude of the epicenter (decimal degrees).
+            lon (float): Longitude of the epicenter (decimal degrees).
+            n (int): Number of closest municipalities to return.
+
+        Returns:
+            list[tuple]: (municipality_name, distance_km) tuples.
+        """
+        csv_path = municipalities._DATA_DIR / "italian_municipalities.csv"
+        with open(csv_path, mode='r', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+
+        distances = [
+            (row['name'], calculate_distance(lat, lon,
+                                             float(row['latitude']),
+                                             float(row['longitude'])))
+            for row in rows
+        ]
+        distances.sort(key=lambda item: item[1])
+        return distances[:max(n, 0)]
+
+    def assertSameMunicipalities(self, result, expected):
+        """Assert that two lists of (name, km) tuples match."""
+        self.assertEqual([name for name, _ in result],
+                         [name for name, _ in expected])
+        for (_, km), (_, expected_km) in zip(result, expected):
+            self.assertAlmostEqual(km, expected_km, places=6)
+
+    def test_matches_reference(self):
+        """Test every backend against the brute-force Haversine search."""
+        for backend in self.backends():
+            result = self.closest(backend, 5)
+            for (lat, lon), row in zip(self.EPICENTERS, result):
+                with self.subTest(backend=backend, lat=lat, lon=lon):
+                    self.assertSameMunicipalities(
+                        row, self.reference(lat, lon, 5))
+                    for name, km in row:
+                        self.assertIsInstance(name, str)
+                        self.assertIsInstance(km, float)
+
+    def test_edge_cases(self):
+        """Test n <= 0, n larger than the dataset and an empty batch."""
+        count = len(self.reference(45.0, 11.0, 10**6))
+        epicenters = self.EPICENTERS[:3]
+        for backend in self.backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.closest(backend, 0, epicenters),
+                                 [[], [], []])
+                self.assertEqual(self.closest(backend, -1, epicenters),
+                                 [[], [], []])
+                self.assertEqual(self.closest(backend, 5, []), [])
+
+                result = self.closest(backend, count + 10, epicenters)
+                for (lat, lon), row in zip(epicenters, result):
+                    self.assertEqual(len(row), count)
+                    self.assertSameMunicipalities(
+                        row, self.reference(lat, lon, count))
+
+    def test_single_epicenter(self):
+        """Test that the scalar function matches the batch function."""
+        for lat, lon in self.EPICENTERS[:10]:
+            with self.subTest(lat=lat, lon=lon):
+                self.assertEqual(
+                    get_closest_municipalities(lat, lon, n=5),
+                    get_closest_municipalities_batch([lat], [lon], n=5)[0]
+                )
+        self.assertEqual(get_closest_municipalities(45.0, 11.0, n=0), [])
+
+    def test_backends_agree_on_ties(self):
+        """Test that tied municipalities come out alike on all backends."""
+        for n in (1, 2, 5, 10):
+            results = {backend: self.closest(backend, n)
+                       for backend in self.backends()}
+            for backend, result in results.items():
+                for row, expected in zip(result, results["numpy"]):
+                    with self.subTest(n=n, backend=backend):
+                        self.assertSameMunicipalities(row, expected)
+
+
+class TestMunicipalitiesCache(TestCase):
+    """
+    Offline tests of the binary cache of the municipalities dataset.
+
+    The cache is written to a temporary directory, and the in-memory
+    caches of the module are cleared around each test.
+    """
+    def setUp(self):
+        """Redirect the cache file and start from empty in-memory caches."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_path = (pathlib.Path(tmp_dir.name)
+                           / "italian_municipalities.npz")
+        self.csv_path = (municipalities._DATA_DIR
+                         / "italian_municipalities.csv")
+
+        patches = [
+            mock.patch.object(municipalities, "_CACHE_PATH",
+                              self.cache_path),
+            mock.patch.dict(os.environ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        os.environ.pop("EQ_NO_CACHE", None)
+
+        self.clear_caches()
+        self.addCleanup(self.clear_caches)
+
+    @staticmethod
+    def clear_caches():
+        """Forget the dataset loaded into memory by the module."""
+        municipalities._load_municipalities.cache_clear()
+        municipalities._tree.cache_clear()
+        municipalities._max_duplicates.cache_clear()
+
+    def load(self):
+        """
+        Load the dataset from scratch, counting the CSV parses.
+
+        Returns:
+            tuple: (arrays, csv_reads) with the arrays returned by
+            `_load_municipalities` and the number of times the CSV file
+            was parsed.
+        """
+        self.clear_caches()
+        with mock.patch.object(municipalities, "_read_csv",
+                               wraps=municipalities._read_csv) as read_csv:
+            arrays = municipalities._load_municipalities()
+        return arrays, read_csv.call_count
+
+    def test_round_trip(self):
+        """Test that the cache is written once and then used."""
+        parsed, csv_reads = self.load()
+        self.assertEqual(csv_reads, 1)
+        self.assertTrue(self.cache_path.exists())
+
+        cached, csv_reads = self.load()
+        self.assertEqual(csv_reads, 0)
+        for array, expected in zip(cached, parsed):
+            np.testing.assert_array_equal(array, expected)
+            self.assertEqual(array.dtype, expected.dtype)
+            self.assertFalse(array.flags.writeable)
+
+    def test_stale_cache(self):
+        """Test that a cache older than the CSV file is rebuilt."""
+        self.load()
+        csv_mtime = self.csv_path.stat().st_mtime
+        os.utime(self.cache_path, (csv_mtime - 60, csv_mtime - 60))
+
+        _, csv_reads = self.load()
+        self.assertEqual(csv_reads, 1)
+        self.assertGreaterEqual(self.cache_path.stat().st_mtime, csv_mtime)
+
+    def test_corrupt_cache(self):
+        """Test that an unreadable cache falls back to the CSV file."""
+        self.cache_path.write_bytes(b"not an npz file")
+
+        arrays, csv_reads = self.load()
+        self.assertEqual(csv_reads, 1)
+        self.assertGreater(len(arrays[0]), 0)
+
+    def test_no_cache(self):
+        """Test that EQ_NO_CACHE neither writes nor reads the cache."""
+        os.environ["EQ_NO_CACHE"] = "1"
+        _, csv_reads = self.load()
+        self.assertEqual(csv_reads, 1)
+        self.assertFalse(self.cache_path.exists())
+
+        # An existing cache is ignored as well
+        del os.environ["EQ_NO_CACHE"]
+        self.load()
+        os.environ["EQ_NO_CACHE"] = "1"
+        _, csv_reads = self.load()
+        self.assertEqual(csv_reads, 1)
+
+
 if __name__ == "__main__":
     """
     Allow running this module directly.